@@ -1,46 +1,29 @@
 import os
-import uuid
+import re
+import functools
+import time
+import hashlib
+import asyncio
 import httpx
-from fastapi import FastAPI, HTTPException
+import orjson
+import ahocorasick
+import numpy as np
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
-from openai import OpenAI
-from typing import List
-
-from pydantic import BaseModel
+import openai
+from openai import AsyncOpenAI
 from typing import List, Optional
-from enum import Enum
-
-
-class SourceType(str, Enum):
-    NEWS = "news"
-    ACADEMIC = "academic"
-    GOVERNMENT = "government"
-    ORGANIZATION = "organization"
-    BLOG = "blog"
-    OTHER = "other"
-
-
-class SearchRequest(BaseModel):
-    query: str
-    source_types: Optional[List[SourceType]] = None
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
-
-class EvidenceCard(BaseModel):
-    id: str
-    title: str
-    link: str
-    snippet: str
-    description: str
-    relation_to_claim: str
-    source_type: SourceType
-    relevance_score: float
-
-
-class SearchResponse(BaseModel):
-    query: str
-    evidence_cards: List[EvidenceCard]
-    total_results: int
+try:
+    from .models import SourceType, SearchRequest, EvidenceCard, SearchResponse, AnalysisItem
+except ImportError:
+    # Running as a script (python api/index.py) rather than as the api package
+    from models import SourceType, SearchRequest, EvidenceCard, SearchResponse, AnalysisItem
 
 # Load environment variables
 load_dotenv()
@@ -51,7 +34,8 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 app = FastAPI(
     title="Evidence Finder API",
     description="API for finding evidence for claims and questions",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -63,198 +47,683 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI client (async so LLM round-trips don't block the event loop).
+# Retries are handled by tenacity below, so the SDK's own retries are disabled.
+async_openai_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=httpx.Timeout(15.0, connect=2.0),
+    max_retries=0,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+)
+
+# Shared Serper client so TCP/TLS connections are reused across searches
+SERPER_CLIENT = httpx.AsyncClient(
+    base_url="https://google.serper.dev",
+    http2=True,
+    timeout=httpx.Timeout(8.0, connect=2.0),
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=128),
+    headers={
+        "X-API-KEY": SERPER_API_KEY or "",
+        "Content-Type": "application/json"
+    }
+)
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close pooled HTTP connections on shutdown"""
+    await SERPER_CLIENT.aclose()
+    await async_openai_client.close()
+
+
+# Exact-match cache of serialized search responses, keyed by query + filters
+RESPONSE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+CACHE_STATS = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+
+def response_cache_key(request: SearchRequest) -> tuple:
+    """Build the response cache key for a search request (equivalent filters share a key)"""
+    return (
+        request.query.lower(),
+        tuple(sorted(set(request.source_types or [])))
+    )
+
+
+# Semantic cache for reworded queries: one matrix of unit-normalized query embeddings,
+# searched by inner product (cosine similarity) among rows with the same filter set
+EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ENTRIES = 5_000
+SEMANTIC_CACHE_INITIAL_CAPACITY = 64
+# Ring buffer shared by all filter sets, so SEMANTIC_CACHE_MAX_ENTRIES bounds total memory.
+# It doubles in capacity up to the max, then overwrites the oldest slot in place.
+SEMANTIC_CACHE = {
+    "vectors": None,
+    "inserted_at": np.empty(0),
+    "filter_ids": np.empty(0, dtype=np.int16),
+    "responses": [],
+    "size": 0,
+    "next": 0
+}
+SEMANTIC_FILTER_IDS = {}  # filters -> small int stored per row
+
+
+async def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts with OpenAI and return unit-normalized vectors"""
+    response = await async_openai_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=texts,
+        timeout=5.0
+    )
+    vectors = np.array([d.embedding for d in response.data], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
 
 
-def classify_source_type(url: str, title: str) -> SourceType:
-    """Classify the source type based on URL and title"""
-    url_lower = url.lower()
-    title_lower = title.lower()
+def nearest_neighbor(vectors: np.ndarray, query_vector: np.ndarray, live: np.ndarray) -> tuple:
+    """Return (index, cosine similarity) of the closest stored vector among live rows"""
+    scores = np.where(live, vectors @ query_vector, -np.inf)
+    best = int(np.argmax(scores))
+    return best, float(scores[best])
+
+
+async def semantic_cache_lookup(query: str, filters: tuple) -> tuple:
+    """Embed the query and return (query_vector, cached response or None)"""
+    try:
+        query_vector = (await embed_texts([query]))[0]
+    except Exception as e:
+        print(f"Query embedding error: {e}")
+        return None, None
     
-    # Academic sources
-    academic_domains = ['.edu', 'scholar.google', 'arxiv.org', 'pubmed', 'jstor', 
-                       'sciencedirect', 'springer', 'wiley', 'nature.com', 'science.org',
-                       'researchgate', 'academia.edu']
-    if any(domain in url_lower for domain in academic_domains):
-        return SourceType.ACADEMIC
+    cache = SEMANTIC_CACHE
+    filter_id = SEMANTIC_FILTER_IDS.get(filters)
+    if filter_id is None:
+        return query_vector, None
+    
+    # Only consider live rows with the same filters, so a stale best match can't hide a live one
+    size = cache["size"]
+    live = (cache["filter_ids"][:size] == filter_id) & (
+        cache["inserted_at"][:size] >= time.monotonic() - RESPONSE_CACHE.ttl
+    )
+    if not live.any():
+        return query_vector, None
+    best, _ = await asyncio.to_thread(nearest_neighbor, cache["vectors"][:size], query_vector, live)
+    
+    # Slots can be overwritten while the search runs off the event loop, so re-check
+    # the winner against the buffer as it is now
+    score = float(cache["vectors"][best] @ query_vector)
+    if (score < SEMANTIC_CACHE_THRESHOLD or cache["filter_ids"][best] != filter_id
+            or time.monotonic() - cache["inserted_at"][best] > RESPONSE_CACHE.ttl):
+        return query_vector, None
+    return query_vector, cache["responses"][best]
+
+
+def semantic_cache_insert(filters: tuple, query_vector: np.ndarray, response: dict):
+    """Add a response to the semantic cache, overwriting the oldest entry when full"""
+    cache = SEMANTIC_CACHE
+    filter_id = SEMANTIC_FILTER_IDS.setdefault(filters, len(SEMANTIC_FILTER_IDS))
+    
+    capacity = len(cache["responses"])
+    if cache["size"] == capacity and capacity < SEMANTIC_CACHE_MAX_ENTRIES:
+        # Grow by doubling; slots are still in insertion order since the buffer never wrapped
+        new_capacity = min(max(capacity * 2, SEMANTIC_CACHE_INITIAL_CAPACITY), SEMANTIC_CACHE_MAX_ENTRIES)
+        vectors = np.empty((new_capacity, query_vector.shape[0]), dtype=np.float32)
+        inserted_at = np.empty(new_capacity)
+        filter_ids = np.empty(new_capacity, dtype=np.int16)
+        if capacity:
+            vectors[:capacity] = cache["vectors"]
+            inserted_at[:capacity] = cache["inserted_at"]
+            filter_ids[:capacity] = cache["filter_ids"]
+        cache["vectors"], cache["inserted_at"], cache["filter_ids"] = vectors, inserted_at, filter_ids
+        cache["responses"] = cache["responses"] + [None] * (new_capacity - capacity)
+        cache["next"] = capacity
+        capacity = new_capacity
     
-    # Government sources
-    gov_domains = ['.gov', '.mil', 'who.int', 'un.org', 'europa.eu', 'parliament']
-    if any(domain in url_lower for domain in gov_domains):
-        return SourceType.GOVERNMENT
+    slot = cache["next"]
+    cache["vectors"][slot] = query_vector
+    cache["inserted_at"][slot] = time.monotonic()
+    cache["filter_ids"][slot] = filter_id
+    cache["responses"][slot] = response
+    cache["size"] = min(cache["size"] + 1, capacity)
+    cache["next"] = (slot + 1) % capacity
+
+
+# Host patterns per source type, in precedence order: when patterns for several
+# types match, the type listed first wins
+SOURCE_TYPE_PATTERNS = [
+    (SourceType.ACADEMIC, ['.edu', 'scholar.google', 'arxiv.org', 'pubmed', 'jstor',
+                           'sciencedirect', 'springer', 'wiley', 'nature.com', 'science.org',
+                           'researchgate', 'academia.edu']),
+    (SourceType.GOVERNMENT, ['.gov', '.mil', 'who.int', 'un.org', 'europa.eu', 'parliament']),
+    (SourceType.NEWS, ['news', 'reuters', 'bbc', 'cnn', 'nytimes', 'washingtonpost',
+                       'guardian', 'forbes', 'wsj', 'bloomberg', 'apnews', 'npr',
+                       'politico', 'axios', 'thehill']),
+    (SourceType.ORGANIZATION, ['.org', 'foundation', 'institute', 'association']),
+    (SourceType.BLOG, ['blog', 'medium.com', 'substack', 'wordpress', 'tumblr']),
+]
+
+# Aho-Corasick automaton matching every pattern in a single pass over the host
+SOURCE_TYPE_AUTOMATON = ahocorasick.Automaton()
+for priority, (source_type, patterns) in enumerate(SOURCE_TYPE_PATTERNS):
+    for pattern in patterns:
+        SOURCE_TYPE_AUTOMATON.add_word(pattern, (priority, source_type))
+SOURCE_TYPE_AUTOMATON.make_automaton()
+
+# Hostname lookups: TLDs and well-known domains resolved by set lookup. Their hits
+# compete with the substring scan under the same precedence order.
+ACADEMIC_TLDS = frozenset({"edu"})
+GOVERNMENT_TLDS = frozenset({"gov", "mil"})
+ACADEMIC_DOMAINS = frozenset({
+    "scholar.google.com", "arxiv.org", "pubmed.ncbi.nlm.nih.gov", "jstor.org",
+    "sciencedirect.com", "springer.com", "wiley.com", "nature.com", "science.org",
+    "researchgate.net"
+})
+GOVERNMENT_DOMAINS = frozenset({"who.int", "un.org", "europa.eu"})
+NEWS_DOMAINS = frozenset({
+    "reuters.com", "bbc.com", "bbc.co.uk", "cnn.com", "nytimes.com", "washingtonpost.com",
+    "theguardian.com", "forbes.com", "wsj.com", "bloomberg.com", "apnews.com", "npr.org",
+    "politico.com", "axios.com", "thehill.com"
+})
+BLOG_DOMAINS = frozenset({"medium.com", "substack.com", "wordpress.com", "tumblr.com"})
+SOURCE_TYPE_PRIORITY = {source_type: priority for priority, (source_type, _) in enumerate(SOURCE_TYPE_PATTERNS)}
+DOMAIN_SOURCE_TYPES = {
+    domain: (SOURCE_TYPE_PRIORITY[source_type], source_type)
+    for source_type, domains in [
+        (SourceType.BLOG, BLOG_DOMAINS),
+        (SourceType.NEWS, NEWS_DOMAINS),
+        (SourceType.GOVERNMENT, GOVERNMENT_DOMAINS),
+        (SourceType.ACADEMIC, ACADEMIC_DOMAINS),
+    ]
+    for domain in domains
+}
+
+
+def url_host(url: str) -> str:
+    """Return the lowercased hostname of a URL, or an empty string"""
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+
+
+@functools.lru_cache(maxsize=20_000)
+def classify_source_type(host: str) -> SourceType:
+    """Classify the source type based on the URL hostname"""
+    labels = host.split(".")
+    # Academic has the highest precedence, so nothing can outrank these hits
+    if labels[-1] in ACADEMIC_TLDS:
+        return SourceType.ACADEMIC
     
-    # News sources
-    news_domains = ['news', 'reuters', 'bbc', 'cnn', 'nytimes', 'washingtonpost', 
-                   'guardian', 'forbes', 'wsj', 'bloomberg', 'apnews', 'npr',
-                   'politico', 'axios', 'thehill']
-    if any(domain in url_lower for domain in news_domains):
-        return SourceType.NEWS
+    matches = [match for _, match in SOURCE_TYPE_AUTOMATON.iter(host)]
     
-    # Organization sources
-    org_domains = ['.org', 'foundation', 'institute', 'association']
-    if any(domain in url_lower for domain in org_domains):
-        return SourceType.ORGANIZATION
+    # Match the host and each parent domain, e.g. www.bbc.co.uk -> bbc.co.uk
+    for i in range(len(labels) - 1):
+        match = DOMAIN_SOURCE_TYPES.get(".".join(labels[i:]))
+        if match is not None:
+            matches.append(match)
+            break
     
-    # Blog sources
-    blog_indicators = ['blog', 'medium.com', 'substack', 'wordpress', 'tumblr']
-    if any(indicator in url_lower for indicator in blog_indicators):
-        return SourceType.BLOG
+    if labels[-1] in GOVERNMENT_TLDS:
+        matches.append((SOURCE_TYPE_PRIORITY[SourceType.GOVERNMENT], SourceType.GOVERNMENT))
     
-    return SourceType.OTHER
+    return min(matches, default=(len(SOURCE_TYPE_PATTERNS), SourceType.OTHER))[1]
 
 
+# Retry policy for transient upstream failures: 3 attempts with jittered backoff
+retry_transient = functools.partial(
+    retry,
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.2, max=2),
+    reraise=True
+)
+
+
+@retry_transient(retry=retry_if_exception_type(httpx.HTTPError))
 async def search_serper(query: str) -> List[dict]:
     """Search using Serper API"""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://google.serper.dev/search",
-            headers={
-                "X-API-KEY": SERPER_API_KEY,
-                "Content-Type": "application/json"
-            },
-            json={
-                "q": query + " evidence research study",
-                "num": 10
-            }
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Serper API error")
-        
-        data = response.json()
-        return data.get("organic", [])
+    response = await SERPER_CLIENT.post(
+        "/search",
+        json={
+            "q": query + " evidence research study",
+            "num": 10
+        }
+    )
+    
+    # Server errors are retried; anything else is reported straight away
+    if response.status_code >= 500:
+        response.raise_for_status()
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Serper API error")
+    
+    data = response.json()
+    return data.get("organic", [])
 
 
-def analyze_evidence_with_openai(query: str, search_results: List[dict]) -> List[dict]:
-    """Use OpenAI to analyze and describe the evidence"""
-    if not search_results:
-        return []
+# Query parameters that only track the click and never change the page content
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src"})
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL for duplicate detection (no scheme, www., trailing slash or tracking params)"""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
     
-    # Prepare context for OpenAI
-    results_text = "\n".join([
-        f"Title: {r.get('title', 'N/A')}\nURL: {r.get('link', 'N/A')}\nSnippet: {r.get('snippet', 'N/A')}\n"
-        for r in search_results[:8]  # Limit to avoid token limits
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
     ])
-    
-    prompt = f"""Analyze the following search results as evidence for the claim/question: "{query}"
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def dedupe_results(search_results: List[dict]) -> List[dict]:
+    """Drop search results whose URL duplicates an earlier result"""
+    seen = set()
+    deduped = []
+    for result in search_results:
+        key = canonicalize_url(result.get("link", ""))
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append(result)
+    return deduped
+
 
-For each result, provide:
-1. A detailed description of what the evidence says (exactly 3-4 full sentences). Do not use ellipses or placeholders.
-2. How it relates to the claim/question (supports, contradicts, provides context, etc.)
-3. A relevance score from 0.0 to 1.0
+# Static analysis instructions. Kept first and byte-identical across requests so
+# OpenAI's automatic prompt caching (>=1024-token exact prefix) can reuse it;
+# only the query and search results go in the trailing user message.
+ANALYSIS_SYSTEM_PROMPT = """You are an expert fact-checker and evidence analyst. You will receive a claim or question from a user, followed by a single web search result. The result has an index, a title, a URL and a short snippet taken from the page. Your job is to analyze the result as evidence for or against the claim, or as evidence that helps answer the question, and to report your analysis in a strict JSON format.
 
-Search Results:
-{results_text}
+## How to analyze the result
+
+Provide:
+
+1. description: A detailed description of what the evidence says, written as exactly 3-4 full sentences. Explain the main finding or statement, who made it (a study, an agency, a news outlet, an organization), and any important numbers, dates, populations or conditions mentioned in the snippet. Do not use ellipses, placeholders or phrases like "the article discusses". Do not truncate the description. Write in plain, neutral language that a non-expert can follow.
+
+2. relation: How the result relates to the claim or question. Start with one of the following labels, then add a short explanation in the same string:
+   - "Supports": the evidence directly backs the claim or gives a clear "yes" answer to the question.
+   - "Contradicts": the evidence directly disputes the claim or gives a clear "no" answer.
+   - "Partially supports": the evidence backs part of the claim, or backs it only under specific conditions.
+   - "Provides context": the evidence is relevant background but does not take a side.
+   - "Mixed": the evidence reports findings that point in different directions.
+   For example: "Supports - a large cohort study found lower mortality among moderate coffee drinkers."
+
+3. relevance_score: A number from 0.0 to 1.0 describing how useful the result is as evidence for this specific claim or question. Use this scale:
+   - 0.9 to 1.0: directly addresses the claim with primary evidence such as a peer-reviewed study, systematic review, official statistics or an official statement from a responsible authority.
+   - 0.7 to 0.89: directly addresses the claim, but through secondary reporting such as quality journalism summarizing research, or primary evidence with clear limitations.
+   - 0.5 to 0.69: addresses a closely related question, or gives useful context without addressing the claim head-on.
+   - 0.3 to 0.49: only loosely related, anecdotal, or mainly opinion.
+   - 0.01 to 0.29: essentially unrelated to the claim or question.
+   - 0.0: exactly zero only when the result has no meaningful evidence at all, such as a paywall notice, a navigation page, an advertisement or a page about something else entirely.
+
+## Judging source quality
+
+Weigh the credibility of the source when assigning the relevance score. Peer-reviewed journals, academic institutions, government agencies and intergovernmental bodies are usually the strongest sources. Established news organizations are generally reliable for reporting events and summarizing research. Advocacy organizations, company pages, personal blogs and forums can be useful but may be selective or promotional, so score them lower unless the snippet cites stronger underlying evidence. Never invent details that are not present in the title or snippet; if the snippet is vague, say what it does establish and keep the score modest.
+
+## Rules
+
+- Refer to the result by the index it was given.
+- Stay neutral. Describe what the evidence says even when it conflicts with common belief.
+- Do not add commentary, headings or explanations outside the JSON.
+
+## Output format
+
+Respond with a single JSON object with exactly these keys: "index" (integer), "description" (string), "relation" (string) and "relevance_score" (number).
+
+Example for the question "Is coffee good for you?" and a result about a cohort study:
+{"index": 0, "description": "A large prospective cohort study of about 500,000 adults in the UK found that people who drank two to three cups of coffee per day had a lower risk of death over roughly ten years than non-drinkers. The association held for ground, instant and decaffeinated coffee. The researchers adjusted for smoking, diet and other lifestyle factors, but as an observational study it cannot prove that coffee causes the benefit.", "relation": "Supports - moderate coffee intake was associated with lower all-cause mortality.", "relevance_score": 0.92}
+
+Example for the same question and a result from a health agency:
+{"index": 3, "description": "A health agency fact sheet explains that up to 400 milligrams of caffeine a day is generally safe for healthy adults. It warns that higher intakes can cause insomnia, anxiety and a fast heartbeat. It also advises pregnant people to limit caffeine further and to discuss intake with a doctor.", "relation": "Partially supports - moderate intake is considered safe, with caveats for high doses and pregnancy.", "relevance_score": 0.8}
+
+Example for the claim "Vaccines cause autism":
+{"index": 1, "description": "A nationwide cohort study of more than 650,000 Danish children found no increased risk of autism among children who received the MMR vaccine compared with unvaccinated children. The result held in subgroups of children with siblings diagnosed with autism and other risk factors. The authors concluded that the study strongly supports that MMR vaccination does not increase the risk of autism.", "relation": "Contradicts - large-scale data show no link between the MMR vaccine and autism.", "relevance_score": 0.97}
+
+Example for the same claim and a result that is only a subscription page:
+{"index": 5, "description": "The result is a subscription sign-up page for a magazine. Its snippet only asks the reader to log in or subscribe to continue reading. It contains no information about vaccines or autism.", "relation": "Provides context - the page contains no evidence about the claim.", "relevance_score": 0.0}"""
+
+
+@retry_transient(retry=retry_if_exception_type((
+    openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, asyncio.TimeoutError
+)))
+async def parse_completion(**kwargs):
+    """Run a structured-output chat completion, bounded by an overall timeout"""
+    return await asyncio.wait_for(
+        async_openai_client.beta.chat.completions.parse(**kwargs),
+        timeout=15.0
+    )
 
-Respond in JSON format as an array:
-[{{"index": 0, "description": "Full detailed description here", "relation": "Relationship description here", "relevance_score": 0.95}}, ...]
-Only include results that have meaningful evidence. Return valid JSON only. Do not truncate the description."""
+
+# Model routing: questions go to the fast, cheap model unless they chain several
+# clauses with strong connectives (list commas and a plain "and" don't count)
+DEFAULT_MODEL = "gpt-4o-mini"
+COMPLEX_MODEL = "gpt-4o"
+COMPLEX_QUERY_WORDS = 25
+CLAUSE_MARKERS = re.compile(r";|\b(?:but|because|although|though|whereas|however|therefore|unless)\b")
+
+
+def pick_model(query: str) -> str:
+    """Pick the OpenAI model for analysis based on query complexity"""
+    words = len(query.split())
+    markers = len(CLAUSE_MARKERS.findall(query.lower()))
+    model = COMPLEX_MODEL if words > COMPLEX_QUERY_WORDS or markers >= 2 else DEFAULT_MODEL
+    print(f"Routing query to {model} ({words} words, {markers} clause markers)")
+    return model
+
+
+async def analyze_one(query: str, result: dict, index: int, model: str = DEFAULT_MODEL) -> Optional[dict]:
+    """Use OpenAI to analyze and describe a single search result"""
+    prompt = f"""Claim/question: "{query}"
+
+Search Result:
+Index: {index}
+Title: {result.get('title', 'N/A')}
+URL: {result.get('link', 'N/A')}
+Snippet: {result.get('snippet', 'N/A')}"""
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = await parse_completion(
+            model=model,
             messages=[
-                {"role": "system", "content": "You are an expert fact-checker and evidence analyst. Analyze search results and determine their relevance as evidence."},
+                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
+            response_format=AnalysisItem,
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=250
         )
         
-        import json
-        content = response.choices[0].message.content
-        # Clean up response - remove markdown code blocks if present
-        if content.startswith("```"):
-            content = content.split("```")[1]
-            if content.startswith("json"):
-                content = content[4:]
-        content = content.strip()
+        usage = response.usage
+        if usage is not None and usage.prompt_tokens_details is not None:
+            print(f"OpenAI prompt tokens: {usage.prompt_tokens} ({usage.prompt_tokens_details.cached_tokens} cached)")
+        
+        parsed = response.choices[0].message.parsed
+        if parsed is None:
+            raise ValueError(f"No parsed analysis: {response.choices[0].message.refusal}")
         
-        return json.loads(content)
+        # Results without meaningful evidence are scored exactly 0 and dropped
+        if parsed.relevance_score <= 0:
+            return None
+        return {**parsed.model_dump(), "index": index}
     except Exception as e:
         print(f"OpenAI analysis error: {e}")
-        # Return basic analysis if OpenAI fails
-        return [
-            {"index": i, "description": r.get("snippet", ""), "relation": "Related to query", "relevance_score": 0.5}
-            for i, r in enumerate(search_results)
-        ]
+        # Return basic analysis if OpenAI fails, flagged so the response is not cached
+        return {"index": index, "description": result.get("snippet", ""), "relation": "Related to query", "relevance_score": 0.5,
+                "fallback": True}
+
+
+# Only the results most similar to the query (by embedding) are sent to GPT
+PREFILTER_TOP_K = 4
+
+
+def source_type_allowed(result: dict, source_types: Optional[List[SourceType]]) -> bool:
+    """Check a search result against the requested source type filter"""
+    return not source_types or classify_source_type(url_host(result.get("link", ""))) in source_types
+
+
+async def prefilter_results(query: str, query_vector: Optional[np.ndarray], search_results: List[dict],
+                            source_types: Optional[List[SourceType]] = None) -> tuple:
+    """Split results into (indexes to analyze with OpenAI, local analyses for the rest)"""
+    # Drop results excluded by the source filter before spending any calls on them
+    candidates = [
+        i for i, r in enumerate(search_results)
+        if source_type_allowed(r, source_types)
+    ][:8]  # Limit to avoid token limits
+    if len(candidates) <= PREFILTER_TOP_K:
+        return candidates, []
+    
+    texts = [f"{search_results[i].get('title', '')} {search_results[i].get('snippet', '')}" for i in candidates]
+    try:
+        # Reuse the query embedding from the semantic cache lookup when there is one
+        if query_vector is None:
+            vectors = await embed_texts([query] + texts)
+            query_vector, vectors = vectors[0], vectors[1:]
+        else:
+            vectors = await embed_texts(texts)
+    except Exception as e:
+        print(f"Result embedding error: {e}")
+        return candidates, []
+    
+    scores = vectors @ query_vector
+    ranked = [int(i) for i in np.argsort(-scores)]
+    local_analyses = [
+        {
+            "index": candidates[i],
+            "description": search_results[candidates[i]].get("snippet", ""),
+            "relation": "Related",
+            "relevance_score": float(np.clip(scores[i], 0.0, 1.0))
+        }
+        for i in ranked[PREFILTER_TOP_K:]
+    ]
+    return sorted(candidates[i] for i in ranked[:PREFILTER_TOP_K]), local_analyses
+
+
+async def analyze_evidence_with_openai(query: str, search_results: List[dict],
+                                       query_vector: Optional[np.ndarray] = None,
+                                       source_types: Optional[List[SourceType]] = None) -> List[dict]:
+    """Analyze the most relevant search results concurrently, one OpenAI call per result"""
+    indexes, local_analyses = await prefilter_results(query, query_vector, search_results, source_types)
+    model = pick_model(query)
+    analyses = await asyncio.gather(*[
+        analyze_one(query, search_results[i], i, model)
+        for i in indexes
+    ])
+    return [a for a in analyses if a is not None] + local_analyses
+
+
+def build_evidence_card(request: SearchRequest, result: dict, result_analysis: dict) -> Optional[EvidenceCard]:
+    """Build an evidence card, or None if it is excluded by the source type filter"""
+    source_type = classify_source_type(url_host(result.get("link", "")))
+    
+    # Apply source type filter if specified
+    if request.source_types and source_type not in request.source_types:
+        return None
+    
+    # Derived from the canonical URL, so an id always refers to the same article; ids are
+    # unique within a response because results are deduplicated by the same canonical form
+    card_id = hashlib.blake2b(canonicalize_url(result.get("link", "")).encode(), digest_size=8).hexdigest()
+    
+    # Fields come from trusted internal code, so skip pydantic validation
+    return EvidenceCard.model_construct(
+        id=card_id,
+        title=result.get("title", "Untitled"),
+        link=result.get("link", ""),
+        snippet=result.get("snippet", ""),
+        description=result_analysis.get("description", result.get("snippet", "")),
+        relation_to_claim=result_analysis.get("relation", "Related"),
+        source_type=source_type,
+        relevance_score=float(result_analysis.get("relevance_score", 0.5))
+    )
+
+
+def cache_search_response(cache_key: tuple, query_vector: Optional[np.ndarray], request: SearchRequest,
+                          evidence_cards: List[EvidenceCard], degraded: bool = False) -> SearchResponse:
+    """Sort evidence cards into a SearchResponse and store it in the caches unless degraded"""
+    # Sort by relevance score
+    evidence_cards.sort(key=lambda x: x.relevance_score, reverse=True)
+    
+    response = SearchResponse.model_construct(
+        query=request.query,
+        evidence_cards=evidence_cards,
+        total_results=len(evidence_cards)
+    )
+    # Responses containing fallback analyses (e.g. during an OpenAI outage) are not cached
+    if degraded:
+        return response
+    
+    RESPONSE_CACHE[cache_key] = response.model_dump()
+    if query_vector is not None:
+        semantic_cache_insert(cache_key[1], query_vector, RESPONSE_CACHE[cache_key])
+    
+    return response
+
+
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data}\n\n"
+
+
+async def stream_cached_response(cached: dict):
+    """Replay a cached search response as Server-Sent Events"""
+    for card in cached["evidence_cards"]:
+        yield sse_event(orjson.dumps(card).decode())
+    yield sse_event(orjson.dumps({"total_results": cached["total_results"]}).decode(), event="done")
+
+
+async def stream_evidence_cards(request: SearchRequest, search_results: List[dict], cache_key: tuple,
+                                query_vector: Optional[np.ndarray]):
+    """Emit each evidence card as soon as its analysis finishes"""
+    indexes, local_analyses = await prefilter_results(
+        request.query, query_vector, search_results, request.source_types
+    )
+    model = pick_model(request.query)
+    tasks = [
+        asyncio.create_task(analyze_one(request.query, search_results[i], i, model))
+        for i in indexes
+    ]
+    evidence_cards = []
+    degraded = False
+    try:
+        for next_analysis in asyncio.as_completed(tasks):
+            result_analysis = await next_analysis
+            if result_analysis is None:
+                continue
+            degraded = degraded or result_analysis.get("fallback", False)
+            
+            card = build_evidence_card(request, search_results[result_analysis["index"]], result_analysis)
+            if card is None:
+                continue
+            
+            evidence_cards.append(card)
+            yield sse_event(card.model_dump_json())
+    finally:
+        # Stop outstanding analyses if the client disconnects mid-stream
+        for task in tasks:
+            task.cancel()
+    
+    # Results filtered out before analysis go last, with their snippet as description
+    for result_analysis in local_analyses:
+        card = build_evidence_card(request, search_results[result_analysis["index"]], result_analysis)
+        if card is not None:
+            evidence_cards.append(card)
+            yield sse_event(card.model_dump_json())
+    
+    cache_search_response(cache_key, query_vector, request, evidence_cards, degraded)
+    yield sse_event(orjson.dumps({"total_results": len(evidence_cards)}).decode(), event="done")
+
+
+# Constant payloads, serialized once at import
+HEALTH_BODY = orjson.dumps({"status": "healthy", "message": "Evidence Finder API is running"})
+SOURCE_TYPES_BODY = orjson.dumps({
+    "source_types": [
+        {"value": st.value, "label": st.value.replace("_", " ").title()}
+        for st in SourceType
+    ]
+})
 
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "Evidence Finder API is running"}
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 
 @app.get("/api/source-types")
 async def get_source_types():
     """Get available source types for filtering"""
+    return Response(
+        content=SOURCE_TYPES_BODY,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=86400"}
+    )
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache hit-rate statistics"""
+    hits = CACHE_STATS["hits"] + CACHE_STATS["semantic_hits"]
+    lookups = hits + CACHE_STATS["misses"]
     return {
-        "source_types": [
-            {"value": st.value, "label": st.value.replace("_", " ").title()}
-            for st in SourceType
-        ]
+        "hits": CACHE_STATS["hits"],
+        "semantic_hits": CACHE_STATS["semantic_hits"],
+        "misses": CACHE_STATS["misses"],
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "size": len(RESPONSE_CACHE),
+        "max_size": RESPONSE_CACHE.maxsize,
+        "semantic_size": SEMANTIC_CACHE["size"]
     }
 
 
 @app.post("/api/search", response_model=SearchResponse)
-async def search_evidence(request: SearchRequest):
+async def search_evidence(request: SearchRequest, stream: bool = False):
     """Search for evidence related to a claim or question"""
     
-    if not request.query.strip():
-        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    # Serve repeated queries straight from the response cache
+    cache_key = response_cache_key(request)
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        CACHE_STATS["hits"] += 1
+        # The key is case-insensitive; echo the query as this request sent it
+        cached = {**cached, "query": request.query}
+    else:
+        # Start the Serper search while the query is embedded for the semantic cache. On a
+        # semantic hit the search is cancelled, but it has usually been sent (and billed) already.
+        serper_task = asyncio.create_task(search_serper(request.query))
+        query_vector, cached = await semantic_cache_lookup(request.query, cache_key[1])
+        if cached is not None:
+            serper_task.cancel()
+            # The search may already have failed; retrieve its exception so it isn't logged as unhandled
+            serper_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            CACHE_STATS["semantic_hits"] += 1
+            cached = RESPONSE_CACHE[cache_key] = {**cached, "query": request.query}
     
-    # Search using Serper
-    search_results = await search_serper(request.query)
+    if cached is not None:
+        if stream:
+            return StreamingResponse(stream_cached_response(cached), media_type="text/event-stream")
+        return cached
+    CACHE_STATS["misses"] += 1
+    
+    try:
+        search_results = dedupe_results(await serper_task)
+    except httpx.HTTPError as e:
+        print(f"Serper search error: {e}")
+        raise HTTPException(status_code=502, detail="Serper API error")
     
     if not search_results:
-        return SearchResponse(
+        response = SearchResponse.model_construct(
             query=request.query,
             evidence_cards=[],
             total_results=0
         )
+        if stream:
+            return StreamingResponse(stream_cached_response(response.model_dump()), media_type="text/event-stream")
+        return response
+    
+    # With ?stream=true, send each card as a Server-Sent Event as soon as it is analyzed
+    if stream:
+        return StreamingResponse(
+            stream_evidence_cards(request, search_results, cache_key, query_vector),
+            media_type="text/event-stream"
+        )
     
     # Analyze with OpenAI
-    analysis = analyze_evidence_with_openai(request.query, search_results)
+    analysis = await analyze_evidence_with_openai(
+        request.query, search_results, query_vector, request.source_types
+    )
     
     # Build evidence cards
     evidence_cards = []
-    for i, result in enumerate(search_results):
-        # Find corresponding analysis
-        result_analysis = next((a for a in analysis if a.get("index") == i), None)
-        
-        if result_analysis is None:
-            continue
-        
-        source_type = classify_source_type(
-            result.get("link", ""),
-            result.get("title", "")
-        )
-        
-        # Apply source type filter if specified
-        if request.source_types and source_type not in request.source_types:
-            continue
-        
-        evidence_cards.append(EvidenceCard(
-            id=str(uuid.uuid4()),
-            title=result.get("title", "Untitled"),
-            link=result.get("link", ""),
-            snippet=result.get("snippet", ""),
-            description=result_analysis.get("description", result.get("snippet", "")),
-            relation_to_claim=result_analysis.get("relation", "Related"),
-            source_type=source_type,
-            relevance_score=float(result_analysis.get("relevance_score", 0.5))
-        ))
-    
-    # Sort by relevance score
-    evidence_cards.sort(key=lambda x: x.relevance_score, reverse=True)
+    for result_analysis in analysis:
+        card = build_evidence_card(request, search_results[result_analysis["index"]], result_analysis)
+        if card is not None:
+            evidence_cards.append(card)
     
-    return SearchResponse(
-        query=request.query,
-        evidence_cards=evidence_cards,
-        total_results=len(evidence_cards)
-    )
+    degraded = any(a.get("fallback", False) for a in analysis)
+    return cache_search_response(cache_key, query_vector, request, evidence_cards, degraded)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, ConfigDict, StringConstraints
+from typing import Annotated, List, Optional
+from enum import Enum
+
+
+class SourceType(str, Enum):
+    NEWS = "news"
+    ACADEMIC = "academic"
+    GOVERNMENT = "government"
+    ORGANIZATION = "organization"
+    BLOG = "blog"
+    OTHER = "other"
+
+
+class SearchRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    query: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+    source_types: Optional[List[SourceType]] = None
+
+
+class EvidenceCard(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    id: str
+    title: str
+    link: str
+    snippet: str
+    description: str
+    relation_to_claim: str
+    source_type: SourceType
+    relevance_score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    evidence_cards: List[EvidenceCard]
+    total_results: int
+
+
+class AnalysisItem(BaseModel):
+    index: int
+    description: str
+    relation: str
+    relevance_score: float